@@ -1,18 +1,16 @@
 from fastapi import FastAPI, HTTPException, File, UploadFile
 from pydantic import BaseModel
-from typing import Dict, Any
-import tiktoken
-import os
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
-from langchain_core.documents import Document
+from fastapi.responses import StreamingResponse
 
 # Import your RAG and Indexing functions from their respective files
-from api.rag import getRetriever, ragChain
-from api.indexing import loadAndChunk, vectorUpsert
+from api.rag import getVectorStore, getRetriever, ragChain
+from api.indexing import ingest
 from api.config import Config
 
 # Import helpers from your helpers.py file
-from api.utilities import getDocID, tokenCount
+from api.utilities import formatSSE
 
 # --- Initialize the FastAPI app ---
 app = FastAPI(
@@ -24,29 +22,49 @@ app = FastAPI(
 # Global variables to hold the RAG components
 retriever = None
 rag_chain = None
+vector_store = None
 
 # --- Startup Event ---
 # This runs once when the API starts. It's crucial for performance.
 @app.on_event("startup")
 async def startup_event():
-    global retriever, rag_chain
+    global retriever, rag_chain, vector_store
     try:
      # NOTE: This part assumes you have already run 'indexing.py' once
         # to populate your Pinecone index.
         # This startup event only initializes the query-time components.
 
-        # 1. Initialize the retriever (connects to your populated Pinecone index)
-        retriever = getRetriever()
+        # 1. Connect to your populated Pinecone index once; ingest and query share it
+        vector_store = getVectorStore()
+
+        # 2. Initialize the retriever on top of the shared vector store
+        retriever = getRetriever(vector_store)
         
-        # 2. Initialize the full RAG chain
+        # 3. Initialize the full RAG chain
         rag_chain = ragChain(retriever)
         
+        # 4. Pay the cold-path costs now rather than on the first user query
+        await warmup()
+
         print("API startup complete. RAG pipeline is ready!")
 
     except Exception as e:
         print(f"Failed to initialize RAG pipeline: {e}")
         raise HTTPException(status_code=500, detail=f"Server startup failed: {e}")
 
+async def warmup():
+    """Opens the Pinecone, Cohere and Gemini connections and seeds the query embedding cache."""
+    try:
+        await asyncio.to_thread(vector_store._index.describe_index_stats)
+        # each retrieval runs a Pinecone query (and a Cohere rerank when enabled)
+        for question in Config.WARMUP_QUERIES or ["warmup"]:
+            await asyncio.to_thread(retriever.invoke, question)
+        await asyncio.to_thread(rag_chain.invoke, "warmup")
+        print("RAG pipeline warmed up")
+    except Exception as e:
+        # a failed warmup only costs latency on the first query; don't block startup on it
+        print(f"RAG warmup failed: {e}")
+
 # --- API Endpoints ---
 
 @app.post("/ingest")
@@ -56,11 +74,8 @@ async def ingest_document(file: UploadFile = File(...)):
     """
     try:
 
-        contents = await file.read()
-
-        # Now call your updated load and chunk function
-        chunks = loadAndChunk(contents, file.filename)
-        vectorUpsert(chunks)
+        # Load, chunk and upsert through the shared ingest path
+        await ingest(file, vector_store)
 
         return {"message": f"Document '{file.filename}' ingested successfully."}
     except Exception as e:
@@ -75,17 +90,22 @@ class QueryRequest(BaseModel):
 @app.post("/query")
 async def run_query(request: QueryRequest):
     """
-    Queries the RAG pipeline with a user's question.
+    Queries the RAG pipeline with a user's question, streaming the answer back as Server-Sent Events.
     """
     if not rag_chain:
         raise HTTPException(status_code=503, detail="RAG service is not ready.")
 
-    try:
-        # Invoke the pre-initialized RAG chain with the user's question
-        response = rag_chain.invoke(request.question)
-        return {"answer": response}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred during query processing: {e}")
+    async def streamAnswer():
+        try:
+            # Forward LLM tokens as they are generated instead of waiting for the full answer
+            async for chunk in rag_chain.astream(request.question):
+                yield formatSSE(chunk)
+        except Exception as e:
+            # The response has already started, so report the failure as an SSE error event
+            print(f"Failed to answer query: {e}")
+            yield formatSSE(f"An error occurred during query processing: {e}", event="error")
+
+    return StreamingResponse(streamAnswer(), media_type="text/event-stream")
 
 
 # Health check endpoint
@@ -8,4 +8,23 @@ class Config:
     PINECONE_API_KEY=os.getenv("PINECONE_API_KEY")
     PINECONE_INDEX_NAME=os.getenv("PINECONE_INDEX_NAME")
     COHERE_API_KEY=os.getenv("COHERE_API_KEY")
-    DOC_PATH="docs/sampletext.txt"
\ No newline at end of file
+    # where indexing.py creates the serverless index if it doesn't exist yet
+    PINECONE_CLOUD=os.getenv("PINECONE_CLOUD", "aws")
+    PINECONE_REGION=os.getenv("PINECONE_REGION", "us-east-1")
+    DOC_PATH="docs/sampletext.txt"
+    # comma-separated questions replayed at startup to seed the query embedding cache
+    WARMUP_QUERIES=[q.strip() for q in os.getenv("WARMUP_QUERIES", "").split(",") if q.strip()]
+    # how many query embeddings CachedQueryEmbeddings keeps (~4 KB each)
+    QUERY_CACHE_SIZE=int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+
+    # retrieval tuning: with reranking off, a plain similarity search over fewer candidates
+    # keeps the Cohere round-trip and client-side MMR off the query path
+    RAG_RERANK_ENABLED=os.getenv("RAG_RERANK_ENABLED", "true").lower()=="true"
+    RAG_SEARCH_TYPE=os.getenv("RAG_SEARCH_TYPE", "mmr" if RAG_RERANK_ENABLED else "similarity")
+    RAG_TOP_K=int(os.getenv("RAG_TOP_K", "10" if RAG_RERANK_ENABLED else "3"))
+    RAG_FETCH_K=int(os.getenv("RAG_FETCH_K", "50" if RAG_RERANK_ENABLED else "20"))
+    RAG_RERANK_TOP_N=int(os.getenv("RAG_RERANK_TOP_N", "3"))
+
+    # keep-alive connection pool and request timeout for the Cohere rerank client
+    RAG_HTTP_POOL_SIZE=int(os.getenv("RAG_HTTP_POOL_SIZE", "32"))
+    RAG_CLIENT_TIMEOUT_MS=int(os.getenv("RAG_CLIENT_TIMEOUT_MS", "10000"))
@@ -1,85 +1,242 @@
 #import libraries
-import io
+import asyncio
+import multiprocessing
 import os
 import tempfile
-from pinecone import Pinecone
-from langchain_pinecone import PineconeEmbeddings
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Union
+from fastapi import UploadFile
+import pypdfium2 as pdfium
+from pinecone import Pinecone, ServerlessSpec
+from langchain_core.documents import Document
+from langchain_pinecone import PineconeEmbeddings, PineconeVectorStore
 from langchain_community.document_loaders import UnstructuredFileLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.text_splitter import TokenTextSplitter
 
 #import modules
 from api.config import Config
-from api.utilities import getDocID, tokenCount
-
-#loading and chunking the document
-def loadAndChunk(content: bytes, name: str):
-    """Loads the provided text and chunks it."""
-    
-    with tempfile.NamedTemporaryFile(suffix=f"_{name}", delete=False) as temp_file:
-        temp_file.write(content)
-        temp_file_path = temp_file.name
+from api.utilities import getDocIDs
+from api.pdfworker import extractPageTexts
 
-    try:
-        loader = UnstructuredFileLoader(file_path=temp_file_path)
-            
-        print("Documents loaded successfully!")
-
-        # document chunking
-        splitter=RecursiveCharacterTextSplitter(
-            chunk_size=1000, 
-            chunk_overlap=200, 
-            length_function=tokenCount,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        print("Documents chunked successfully!")
-            
-        documents = loader.load()
-            
-    finally:
-        # Ensure the temporary file is always deleted
-        os.remove(temp_file_path)
+#PDFs below this page count are extracted in-process; handing them to the pool would cost more than it saves
+PARALLEL_PDF_MIN_PAGES=16
 
-    return splitter.split_documents(documents)
+#PDFium isn't thread-safe even across separate documents, and concurrent ingests load
+#documents from different worker threads, so every in-process pdfium call holds this lock
+pdfiumLock=threading.Lock()
 
-#create vector embedings and store them in a vector DB
-def vectorUpsert(chunks: list):
-    """Translates the document chunks into vector embeddings and upserts them to a vector DB (Pinecone in this case)"""
-    from langchain_pinecone import PineconeVectorStore
+#one long-lived pool for PDF extraction, created on first use. forkserver rather than the
+#default fork: forking a threaded server process can copy locks held by other threads
+pdfPool=None
+pdfPoolLock=threading.Lock()
 
-    #vector embeddings
-    embeddings=PineconeEmbeddings(model="multilingual-e5-large")
-    print("Documnents embedded successfully")
+def getPdfPool():
+    """Returns the shared PDF extraction process pool, creating it on first use."""
+    global pdfPool
+    with pdfPoolLock:
+        if pdfPool is None:
+            pdfPool=ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+        return pdfPool
 
-    #preparing docs for upserting
-    docsWithIDs=[]
-    for doc in chunks:
-        docID=getDocID(doc)
-        doc.metadata["document_id"]=docID
-        docsWithIDs.append(doc)
+def resetPdfPool(brokenPool):
+    """Shuts down a broken PDF pool and clears it so the next call builds a fresh one."""
+    global pdfPool
+    with pdfPoolLock:
+        if pdfPool is brokenPool:
+            pdfPool=None
+    brokenPool.shutdown(wait=False, cancel_futures=True)
 
-    pc = Pinecone(api_key=Config.PINECONE_API_KEY)
+#fast PDF loading with PDFium, pages split across worker processes
+def loadPdfFast(filePath: str):
+    """Extracts the text of every PDF page into a Document with a 1-based page number for citations."""
 
-    if Config.PINECONE_INDEX_NAME in [index['name'] for index in pc.list_indexes()]:
-        print("Index already exists. Performing upsert...")
-        # Initialize an existing PineconeVectorStore instance
-        vectorStore = PineconeVectorStore.from_existing_index(
-            index_name=Config.PINECONE_INDEX_NAME,
-            embedding=embeddings
-        )
-        # Use the add_documents method to upsert
-        vectorStore.add_documents(documents=docsWithIDs, ids=[doc.metadata["document_id"] for doc in docsWithIDs])
+    with pdfiumLock:
+        pdf=pdfium.PdfDocument(filePath)
+        pageCount=len(pdf)
+        pdf.close()
+
+    if pageCount<PARALLEL_PDF_MIN_PAGES:
+        batches=[list(range(pageCount))]
+        with pdfiumLock:
+            results=[extractPageTexts(filePath, batches[0])]
     else:
-        print("Index does not exist. Creating and populating for the first time...")
-        # This line is for initial population only
-        PineconeVectorStore.from_documents(
-            documents=docsWithIDs,
-            embedding=embeddings,
-            index_name=Config.PINECONE_INDEX_NAME
+        # one contiguous page range per worker; each worker opens its own handle to the file
+        workers=min(os.cpu_count() or 1, pageCount)
+        step=-(-pageCount//workers)
+        batches=[list(range(i, min(i+step, pageCount))) for i in range(0, pageCount, step)]
+        pool=getPdfPool()
+        try:
+            results=list(pool.map(extractPageTexts, [filePath]*len(batches), batches))
+        except BrokenProcessPool:
+            # a worker died (OOM kill, crash in PDFium); drop the pool so later ingests
+            # get a fresh one, and finish this file in-process
+            print(f"PDF worker pool broke while extracting {filePath}; retrying in-process")
+            resetPdfPool(pool)
+            with pdfiumLock:
+                results=[extractPageTexts(filePath, batch) for batch in batches]
+
+    documents=[]
+    for pageIndices, texts in zip(batches, results):
+        for i, text in zip(pageIndices, texts):
+            if text.strip():
+                documents.append(Document(page_content=text, metadata={"source": filePath, "page": i+1}))
+    return documents
+
+# document chunking: each document is encoded once and the token
+# array is windowed, instead of re-tokenizing every candidate split.
+# disallowed_special=() treats special-token text as ordinary text, skipping the scan for it
+SPLITTER=TokenTextSplitter.from_tiktoken_encoder(
+    encoding_name="cl100k_base",
+    chunk_size=1000,
+    chunk_overlap=200,
+    disallowed_special=()
+)
+
+#loading the document
+def loadDocuments(filePath: str, sourceName: str=None):
+    """Loads the document at the given path, one Document per PDF page.
+    `sourceName` replaces the path in the source metadata, e.g. an upload's filename instead of its temp path."""
+
+    if filePath.lower().endswith(".pdf"):
+        documents = loadPdfFast(filePath)
+    else:
+        loader = UnstructuredFileLoader(file_path=filePath)
+        documents = loader.load()
+
+    # source feeds the chunk IDs, so it must be stable across re-uploads of the same file
+    if sourceName is not None:
+        for document in documents:
+            document.metadata["source"]=sourceName
+    return documents
+
+#vector store for standalone use (the API passes in the one it opened at startup); built on first use
+defaultVectorStore=None
+
+def getDefaultVectorStore():
+    """Opens the Pinecone index, creating it first if it doesn't exist yet, and wraps it in a vector store.
+    The store is built once per process and reused, along with its embeddings client."""
+    global defaultVectorStore
+    if defaultVectorStore is None:
+        pc = Pinecone(api_key=Config.PINECONE_API_KEY)
+        if Config.PINECONE_INDEX_NAME not in [index['name'] for index in pc.list_indexes()]:
+            print("Index does not exist. Creating it for the first time...")
+            # multilingual-e5-large produces 1024-dimensional vectors
+            pc.create_index(
+                name=Config.PINECONE_INDEX_NAME,
+                dimension=1024,
+                metric="cosine",
+                spec=ServerlessSpec(cloud=Config.PINECONE_CLOUD, region=Config.PINECONE_REGION)
+            )
+        defaultVectorStore = PineconeVectorStore(
+            index=pc.Index(Config.PINECONE_INDEX_NAME),
+            embedding=PineconeEmbeddings(model="multilingual-e5-large"),
+            text_key="text"
         )
-        print("Embedding and storage completed")
+    return defaultVectorStore
+
+#producer-consumer pipeline: chunk batches -> embed workers -> upsert workers
+async def upsertPipeline(chunkBatches, vectorStore, concurrency: int=8):
+    """Embeds and upserts chunk batches as they arrive from an async iterator, so the chunking, embedding and
+    upsert stages overlap instead of running back to back. Returns the number of chunks upserted."""
+
+    # bounded queues apply backpressure so a fast producer can't buffer the whole document
+    embedQueue=asyncio.Queue(maxsize=4)
+    upsertQueue=asyncio.Queue(maxsize=4)
+    upserted=0
+
+    async def producer():
+        async for batch in chunkBatches:
+            docIDs=await asyncio.to_thread(getDocIDs, batch)
+            for doc, docID in zip(batch, docIDs):
+                doc.metadata["document_id"]=docID
+            await embedQueue.put(batch)
+        for _ in range(concurrency):
+            await embedQueue.put(None)
+
+    async def embedWorker():
+        while (batch := await embedQueue.get()) is not None:
+            vectors=await vectorStore.embeddings.aembed_documents([doc.page_content for doc in batch])
+            await upsertQueue.put((batch, vectors))
+        await upsertQueue.put(None)
+
+    async def upsertWorker():
+        nonlocal upserted
+        while (item := await upsertQueue.get()) is not None:
+            batch, vectors=item
+            # same record layout PineconeVectorStore.add_texts writes: page text stored under the text key
+            records=[
+                (doc.metadata["document_id"], vector, {**doc.metadata, vectorStore._text_key: doc.page_content})
+                for doc, vector in zip(batch, vectors)
+            ]
+            await asyncio.to_thread(vectorStore._index.upsert, vectors=records, namespace=vectorStore._namespace)
+            upserted+=len(batch)
+
+    tasks=[asyncio.create_task(producer())]
+    tasks+=[asyncio.create_task(embedWorker()) for _ in range(concurrency)]
+    tasks+=[asyncio.create_task(upsertWorker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        # a failed stage would leave the others blocked on their queues
+        for task in tasks:
+            task.cancel()
+        raise
+
+    print(f"Embedded and upserted {upserted} chunks")
+    return upserted
+
+async def chunkBatches(filePath: str, sourceName: str=None, batchSize: int=64):
+    """Yields chunk batches document by document, so embedding starts before the whole file is split."""
+
+    # 64 chunks per batch keeps each embed request under Pinecone inference's 96-input limit
+    # and each upsert of ~1000-token chunks comfortably under its 2 MB request limit
+
+    documents=await asyncio.to_thread(loadDocuments, filePath, sourceName)
+    print("Documents loaded successfully!")
+
+    pending=[]
+    for document in documents:
+        pending.extend(await asyncio.to_thread(SPLITTER.split_documents, [document]))
+        while len(pending)>=batchSize:
+            yield pending[:batchSize]
+            pending=pending[batchSize:]
+    if pending:
+        yield pending
+
+async def ingestFile(filePath: str, vectorStore=None, sourceName: str=None):
+    """Loads, chunks and upserts the document at the given path, recording `sourceName` (default: the path)
+    as its source. Returns the number of chunks."""
+
+    if vectorStore is None:
+        vectorStore=await asyncio.to_thread(getDefaultVectorStore)
+
+    return await upsertPipeline(chunkBatches(filePath, sourceName), vectorStore)
+
+#single entry point for ingesting a document from the API or the command line
+async def ingest(source: Union[str, UploadFile], vectorStore=None):
+    """Loads, chunks and upserts a document given either a file path or an uploaded file. Returns the number of chunks."""
+
+    if isinstance(source, str):
+        return await ingestFile(source, vectorStore)
+
+    # stream the upload to disk in 1 MiB pieces instead of holding the whole file in memory
+    with tempfile.NamedTemporaryFile(suffix=f"_{source.filename}", delete=False) as temp_file:
+        while piece := await source.read(1 << 20):
+            temp_file.write(piece)
+        temp_file_path = temp_file.name
+
+    try:
+        return await ingestFile(temp_file_path, vectorStore, sourceName=source.filename)
+    finally:
+        # Ensure the temporary file is always deleted
+        os.remove(temp_file_path)
 
 if __name__=="__main__":
     print("Starting Document Indexing")
-    chunks=loadAndChunk(Config.DOC_PATH)
-    vectorUpsert(chunks)
-    print("Indexing complete")
\ No newline at end of file
+    asyncio.run(ingest(Config.DOC_PATH))
+    print("Indexing complete")
@@ -0,0 +1,12 @@
+#PDF page extraction for the indexing process pool. Kept apart from indexing.py and imports
+#nothing but pypdfium2, so pool workers don't load FastAPI, LangChain and the Pinecone client
+import pypdfium2 as pdfium
+
+def extractPageTexts(filePath: str, pageIndices: list):
+    """Opens the PDF and returns the text of the given pages. Runs inside a pool worker process,
+    or in-process under indexing's pdfiumLock."""
+    pdf=pdfium.PdfDocument(filePath)
+    try:
+        return [pdf[i].get_textpage().get_text_range() for i in pageIndices]
+    finally:
+        pdf.close()
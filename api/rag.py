@@ -1,35 +1,67 @@
 import os
+import cohere
+import httpx
+from pinecone import Pinecone
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_pinecone import PineconeEmbeddings
 from langchain_cohere import CohereRerank
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from langchain_core.runnables import RunnableParallel, RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from langchain_pinecone import PineconeVectorStore
 
 from api.config import Config
-from api.utilities import formatDocsWithIDs
+from api.utilities import formatDocsWithIDs, CachedQueryEmbeddings
 
-def getRetriever():
-    """Creates a Retriever composed of MMR Retrieval and Cohere Reranking"""
-    
-    embeddings = PineconeEmbeddings(model="multilingual-e5-large")
-    vectorStore = PineconeVectorStore.from_existing_index(
-        index_name=Config.PINECONE_INDEX_NAME,
+def getVectorStore():
+    """Connects to the existing Pinecone index"""
+
+    # repeated questions skip the embedding round-trip
+    embeddings = CachedQueryEmbeddings(PineconeEmbeddings(model="multilingual-e5-large"), maxsize=Config.QUERY_CACHE_SIZE)
+    # one client for the life of the process, so its urllib3 keep-alive connections are reused across queries
+    pc = Pinecone(api_key=Config.PINECONE_API_KEY)
+    vectorStore = PineconeVectorStore(
+        index=pc.Index(Config.PINECONE_INDEX_NAME),
         embedding=embeddings
     )
     print("Vector store connection established.")
+    return vectorStore
+
+def getRetriever(vectorStore=None):
+    """Creates a Retriever composed of MMR Retrieval and Cohere Reranking (reranking and MMR can be turned off via Config)"""
+    
+    if vectorStore is None:
+        vectorStore = getVectorStore()
+
+    searchKwargs={"k":Config.RAG_TOP_K}
+    if Config.RAG_SEARCH_TYPE=="mmr":
+        searchKwargs["fetch_k"]=Config.RAG_FETCH_K
 
     retriever=vectorStore.as_retriever(
-        search_type="mmr",
-        search_kwargs={"fetch_k":50, "k":10}
+        search_type=Config.RAG_SEARCH_TYPE,
+        search_kwargs=searchKwargs
     )
 
+    if not Config.RAG_RERANK_ENABLED:
+        print("Reranking disabled; using the vector store retriever directly")
+        return retriever
+
+    # one pooled HTTP client keeps the Cohere connection warm between queries
+    httpClient=httpx.Client(
+        timeout=Config.RAG_CLIENT_TIMEOUT_MS/1000,
+        limits=httpx.Limits(max_keepalive_connections=Config.RAG_HTTP_POOL_SIZE, keepalive_expiry=60)
+    )
     compressor=CohereRerank(
         model="rerank-english-v3.0",
         cohere_api_key=Config.COHERE_API_KEY,
-        top_n=3
+        # the SDK passes its own per-request timeout (None unless set), overriding the httpx client's
+        client=cohere.ClientV2(
+            api_key=Config.COHERE_API_KEY,
+            httpx_client=httpClient,
+            timeout=Config.RAG_CLIENT_TIMEOUT_MS/1000
+        ),
+        top_n=Config.RAG_RERANK_TOP_N
     )
 
     finalRetriever=ContextualCompressionRetriever(
@@ -62,8 +94,10 @@ def ragChain(finalRetriever):
     llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0.2)
     print("LLM Initialized")
 
+    # Retrieval+rerank and the question passthrough run as parallel branches; under
+    # astream/ainvoke the retriever is awaited via ainvoke, so no step blocks the event loop
     rag = (
-        {"context": finalRetriever | RunnableLambda(formatDocsWithIDs), "question": RunnablePassthrough()}
+        RunnableParallel(context=finalRetriever | RunnableLambda(formatDocsWithIDs), question=RunnablePassthrough())
         | prompt
         | llm
         | StrOutputParser()
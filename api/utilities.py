@@ -1,31 +1,119 @@
 import tiktoken
-import hashlib
+import os
+import json
+import base64
+import threading
+from array import array
+from collections import OrderedDict
+from blake3 import blake3
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
-def tokenCount(text):
-    tokenizer=tiktoken.get_encoding("cl100k_base")
-    return len(tokenizer.encode(text))
+# Build the encoder once at import time instead of on every call
+_ENC=tiktoken.get_encoding("cl100k_base")
+# Longest token in bytes; bounds how few tokens a text can encode to
+_MAX_TOKEN_BYTES=max(map(len, _ENC.token_byte_values()))
+
+def tokenCount(text: str) -> int:
+    """Counts the cl100k_base tokens in the text."""
+    # encode_ordinary skips the special-token scan (and never raises on text like "<|endoftext|>")
+    return len(_ENC.encode_ordinary(text))
+
+def tokenCountAtMost(text: str, limit: int) -> bool:
+    """Checks whether the text is at most `limit` tokens, skipping the encode when its length already decides it."""
+    # every token covers at least one byte, and at most _MAX_TOKEN_BYTES of them
+    if len(text) > limit * _MAX_TOKEN_BYTES:
+        return False
+    byteLength = len(text.encode('utf-8'))
+    if byteLength <= limit:
+        return True
+    if byteLength > limit * _MAX_TOKEN_BYTES:
+        return False
+    return tokenCount(text) <= limit
+
+def tokenCountBatch(texts: list) -> list:
+    """Counts the cl100k_base tokens in each text with a single batched call into the encoder."""
+    # repeated boilerplate (page headers, footers) is only tokenized once
+    uniqueTexts = list(dict.fromkeys(texts))
+    # the batch call releases the GIL and spreads the texts over native threads
+    counts = [len(tokens) for tokens in _ENC.encode_ordinary_batch(uniqueTexts, num_threads=os.cpu_count() or 1)]
+    countByText = dict(zip(uniqueTexts, counts))
+    return [countByText[text] for text in texts]
+
+def hashDocID(content: str, metadataBytes: bytes) -> str:
+    """Hashes chunk content and its serialized metadata into a chunk ID."""
+    # BLAKE3 is SIMD-parallel inside a single hash; 16 bytes is plenty for chunk-level uniqueness
+    # Combine with metadata to make it more unique, as one buffer hashed in a single call
+    payload = content.encode('utf-8') + b"\x1f" + metadataBytes
+    # url-safe base64 of the 128-bit digest: 22 characters instead of 32 hex
+    return base64.urlsafe_b64encode(blake3(payload).digest(length=16)).rstrip(b"=").decode('ascii')
 
 def getDocID(doc: Document) -> str:
     """Generates a unique, stable ID for a document chunk."""
-    content_hash = hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()
-    # Combine with metadata to make it more unique
-    metadata_string = str(doc.metadata)
-    metadata_hash = hashlib.sha256(metadata_string.encode('utf-8')).hexdigest()
-    return f"{content_hash}-{metadata_hash}"
+    # canonical JSON (sorted keys, no whitespace) doesn't depend on the order loaders inserted
+    # metadata keys; the ID written back into the metadata is left out so a second pass gives the same ID
+    metadata = {key: value for key, value in doc.metadata.items() if key != "document_id"}
+    metadataBytes = json.dumps(metadata, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+    return hashDocID(doc.page_content, metadataBytes)
+
+def getDocIDs(docs) -> list:
+    """Generates IDs for many document chunks at once, in input order."""
+    # sequential on purpose: BLAKE3 hashes a 64-chunk pipeline batch (~256 KB) in well under a
+    # millisecond, less than a thread handoff and the GIL-bound json.dumps per chunk would cost
+    return [getDocID(doc) for doc in docs]
 
 def formatDocsWithIDs(docs):
     """
     Formats documents for the LLM. For PDFs, it includes a page number citation.
     For other documents, it includes the content without a citation.
     """
-    formatted_output = []
-    for i, doc in enumerate(docs):
-        # Check if the document has a 'page' key in its metadata, indicating it's a PDF chunk
-        if "page" in doc.metadata:
-            formatted_output.append(f"Source: Page {doc.metadata['page']}\nContent: {doc.page_content}")
-        else:
-            # For other document types, just provide the content without a source ID
-            formatted_output.append(f"Content: {doc.page_content}")
-            
-    return "\n\n".join(formatted_output)
\ No newline at end of file
+    # A 'page' in the metadata indicates a PDF chunk; other document types get no source ID
+    return "\n\n".join(
+        f"Source: Page {page}\nContent: {doc.page_content}" if (page := doc.metadata.get("page")) is not None
+        else f"Content: {doc.page_content}"
+        for doc in docs
+    )
+
+def normalizeQuery(text: str) -> str:
+    """Lowercases the query and collapses whitespace so trivially different phrasings share a cache key."""
+    return " ".join(text.lower().split())
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an embeddings model with an LRU cache on embed_query. Document embedding passes straight through."""
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = 4096):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        # embed_query is called from executor threads under aembed_query
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalizeQuery(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+        if vector is None:
+            # the normalized text is only the cache key; the model (cased) embeds the question as asked
+            # float32 array: ~4 KB per 1024-dim vector instead of ~33 KB as a list of Python floats;
+            # the model's vectors are float32 to begin with, so nothing is lost
+            vector = array('f', self.embeddings.embed_query(text))
+            with self._lock:
+                self._cache[key] = vector
+                if len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        # hand out a fresh list so callers can't mutate the cached vector
+        return list(vector)
+
+def formatSSE(data: str, event: str = None) -> str:
+    """Frames a piece of text as a Server-Sent Event. Multi-line text becomes one data: line per line."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
@@ -105,25 +105,53 @@ export default function HomePage() {
         throw new Error("Query failed. Please check the backend.");
       }
 
-      const data = await response.json();
+      // Parse citations from the answer string
+      const formatAnswer = (text) => {
+        const citationRegex = /\[Page (\d+)]/g; // CHANGE THIS LINE
+        return text.replace(citationRegex, (match, page) => {
+          return `<sup>[p.${page}]</sup>`;
+        });
+      };
+
+      // The backend streams the answer as Server-Sent Events; render it as it arrives
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let fullAnswer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line; keep any partial event in the buffer
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const event of events) {
+          const lines = event.split("\n");
+          const data = lines
+            .filter((line) => line.startsWith("data: "))
+            .map((line) => line.slice("data: ".length))
+            .join("\n");
+          if (lines.includes("event: error")) {
+            throw new Error(data);
+          }
+          fullAnswer += data;
+          setAnswer(formatAnswer(fullAnswer));
+        }
+      }
       const endTime = performance.now();
 
-      if (data.answer.toLowerCase().includes("i don't know")) {
+      if (fullAnswer.toLowerCase().includes("i don't know")) {
         setAnswer("I'm sorry, I couldn't find an answer to that question in the provided documents.");
         setSources(null);
       } else {
-        // Parse citations from the answer string
-        const citationRegex = /\[Page (\d+)]/g; // CHANGE THIS LINE
-        const formattedAnswer = data.answer.replace(citationRegex, (match, page) => {
-          return `<sup>[p.${page}]</sup>`;
-        });
-        setAnswer(formattedAnswer);
-        setSources(data.sources); // Assumes backend returns sources in a 'sources' key
+        setAnswer(formatAnswer(fullAnswer));
+        setSources(null); // The streamed response carries only the answer text
       }
       
       setResponseTime((endTime - startTime).toFixed(2));
       // NOTE: These are mock estimates for now. Your backend can return real ones.
-      setTokenEstimate(Math.floor(data.answer.length / 4));
+      setTokenEstimate(Math.floor(fullAnswer.length / 4));
 
     } catch (error) {
       console.error(error);